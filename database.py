@@ -68,6 +68,32 @@ class Database:
             self.logger.error(f"Error inserting measurement: {e}")
             raise
             
+    def insert_measurements(self, measurements):
+        """Insert a batch of measurement records in a single transaction
+
+        Args:
+            measurements: list of dicts with device_id, timestamp, voltage,
+                          current, power and kwh keys
+        """
+        if not measurements:
+            return
+
+        try:
+            with self._get_connection() as conn:
+                conn.executemany('''
+                    INSERT INTO measurements
+                    (device_id, timestamp, voltage, current, power, kwh)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [(m['device_id'], m['timestamp'], m['voltage'],
+                       m['current'], m['power'], m['kwh']) for m in measurements])
+
+                conn.commit()
+                self.logger.debug(f"Inserted batch of {len(measurements)} measurements")
+
+        except Exception as e:
+            self.logger.error(f"Error inserting measurement batch: {e}")
+            raise
+
     def get_measurements(self, device_id=None, limit=100, offset=0):
         """Get measurements, optionally filtered by device_id"""
         try:
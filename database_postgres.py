@@ -41,7 +41,55 @@ class PostgresDatabase:
             db.session.rollback()
             return False
             
-    def get_measurements(self, device_id: Optional[str] = None, 
+    def insert_measurements(self, measurements: List[Dict]) -> bool:
+        """Insert a batch of measurement records in a single commit
+
+        Args:
+            measurements: list of dicts with device_id, timestamp, voltage,
+                          current, power and kwh keys
+        """
+        if not measurements:
+            return True
+
+        try:
+            # Runs from the aggregator thread, so push an app context
+            from app import app
+
+            with app.app_context():
+                rows = []
+                for m in measurements:
+                    timestamp = m['timestamp']
+                    if isinstance(timestamp, str):
+                        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+                    rows.append(DeviceMeasurement(
+                        device_id=m['device_id'],
+                        timestamp=timestamp,
+                        voltage=m['voltage'],
+                        current=m['current'],
+                        power=m['power'],
+                        kwh=m['kwh']
+                    ))
+
+                db.session.add_all(rows)
+                db.session.commit()
+
+            self.logger.debug(f"Inserted batch of {len(measurements)} measurements")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error inserting measurement batch: {e}")
+            # Rollback needs an app context too - the one above is gone
+            # by the time an exception lands here
+            try:
+                from app import app
+                with app.app_context():
+                    db.session.rollback()
+            except Exception as rollback_error:
+                self.logger.error(f"Error rolling back measurement batch: {rollback_error}")
+            return False
+
+    def get_measurements(self, device_id: Optional[str] = None,
                         limit: int = 100, offset: int = 0) -> List[Dict]:
         """Get measurements, optionally filtered by device_id"""
         try:
@@ -55,19 +103,8 @@ class PostgresDatabase:
                 desc(DeviceMeasurement.id)
             ).limit(limit).offset(offset).all()
             
-            result = []
-            for m in measurements:
-                result.append({
-                    'id': m.id,
-                    'device_id': m.device_id,
-                    'timestamp': m.timestamp.isoformat(),
-                    'voltage': m.voltage,
-                    'current': m.current,
-                    'power': m.power,
-                    'kwh': m.kwh,
-                    'created_at': m.created_at.isoformat() if m.created_at else None
-                })
-                
+            result = DeviceMeasurement.many_to_list(measurements)
+
             self.logger.debug(f"Retrieved {len(result)} measurements")
             return result
             
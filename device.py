@@ -44,21 +44,26 @@ class VirtualDevice:
                 'kwh': kwh
             }
 
-def device_worker(device_id, device_type, interval_seconds=None):
+def device_worker(device_id, device_type, interval_seconds=None, measurement_queue=None):
     """Worker function that runs in a separate process for each device"""
     import os
     logging.basicConfig(level=logging.DEBUG)
     logger = logging.getLogger(f'Device-{device_id}')
-    
+
     # Get measurement interval from settings if not provided
     if interval_seconds is None:
         from device_settings import device_settings
         interval_seconds = device_settings.get_measurement_interval()
-    
+
     # Create database connection for this process
-    # Check if PostgreSQL is available, otherwise use SQLite
+    # When a shared measurement queue is provided, the DeviceManager
+    # aggregator owns the database writes and no per-worker connection
+    # is needed
     database_url = os.environ.get("DATABASE_URL")
-    if database_url:
+    db = None
+    if measurement_queue is not None:
+        logger.info(f"Device worker {device_id} using shared measurement queue")
+    elif database_url:
         # Import Flask app context for PostgreSQL
         from flask import Flask
         from flask_sqlalchemy import SQLAlchemy
@@ -86,13 +91,27 @@ def device_worker(device_id, device_type, interval_seconds=None):
         db = Database()
         logger.info(f"Device worker {device_id} using SQLite")
     
-    # Initialize MQTT client if enabled - each device gets its own unique client
+    # Initialize MQTT client if enabled - each device gets its own unique
+    # client unless the shared broker connection is configured
     mqtt_client = None
+    shared_mqtt = None
     try:
-        from mqtt_client import CumulocityMqttClient, mqtt_settings
+        from mqtt_client import CumulocityMqttClient, SharedBrokerConnection, mqtt_settings
         if mqtt_settings.is_enabled():
             connection_params = mqtt_settings.get_connection_params()
-            if connection_params['broker_host']:
+            if connection_params['broker_host'] and mqtt_settings.use_shared_connection():
+                # Shared mode: one gateway connection per process, with
+                # this device registered as a Cumulocity child device
+                device_name = f"iot_sim_{device_id}"
+                shared_mqtt = SharedBrokerConnection.acquire(connection_params)
+                if shared_mqtt.connect():
+                    shared_mqtt.register_child_device(device_id, device_name)
+                    logger.info(f"MQTT enabled for {device_id} via shared broker connection")
+                else:
+                    logger.warning(f"Failed to connect shared MQTT connection for {device_id}")
+                    shared_mqtt.release()
+                    shared_mqtt = None
+            elif connection_params['broker_host']:
                 # Create unique client ID for this specific device instance
                 unique_client_id = f"iot_sim_{device_id}_client"
                 device_name = f"iot_sim_{device_id}"
@@ -108,7 +127,10 @@ def device_worker(device_id, device_type, interval_seconds=None):
                     use_ssl=connection_params['use_ssl'],
                     ca_cert_path=connection_params['ca_cert_path'],
                     client_cert_path=connection_params['client_cert_path'],
-                    client_key_path=connection_params['client_key_path']
+                    client_key_path=connection_params['client_key_path'],
+                    max_inflight=connection_params['max_inflight_messages'],
+                    max_queued=connection_params['max_queued_messages'],
+                    transport=connection_params['transport']
                 )
                 
                 if mqtt_client.connect():
@@ -125,6 +147,7 @@ def device_worker(device_id, device_type, interval_seconds=None):
     except Exception as e:
         logger.error(f"Error initializing MQTT for {device_id}: {e}")
         mqtt_client = None
+        shared_mqtt = None
         
     device = VirtualDevice(device_id, device_type)
     device.interval_seconds = interval_seconds  # Store for kWh calculation
@@ -135,19 +158,26 @@ def device_worker(device_id, device_type, interval_seconds=None):
         while True:
             # Generate measurement data
             data = device.generate_data()
-            
-            # Store in database
-            db.insert_measurement(
-                device_id=data['device_id'],
-                timestamp=data['timestamp'],
-                voltage=data['voltage'],
-                current=data['current'],
-                power=data['power'],
-                kwh=data['kwh']
-            )
+
+            # Store in database - either via the shared queue (batched by
+            # the DeviceManager aggregator) or directly
+            if measurement_queue is not None:
+                measurement_queue.put(data)
+            else:
+                db.insert_measurement(
+                    device_id=data['device_id'],
+                    timestamp=data['timestamp'],
+                    voltage=data['voltage'],
+                    current=data['current'],
+                    power=data['power'],
+                    kwh=data['kwh']
+                )
             
             # Send to MQTT if enabled and connected
-            if mqtt_client and mqtt_client.connected:
+            if shared_mqtt is not None:
+                if not shared_mqtt.send_measurement_for_device(device_id, data):
+                    logger.warning(f"Failed to send shared MQTT measurement for {device_id}")
+            elif mqtt_client and mqtt_client.connected:
                 success = mqtt_client.send_measurement(data)
                 if not success:
                     logger.warning(f"Failed to send MQTT measurement for {device_id}")
@@ -178,6 +208,8 @@ def device_worker(device_id, device_type, interval_seconds=None):
         logger.error(f"Error in device worker {device_id}: {e}")
     finally:
         # Clean up MQTT connection
+        if shared_mqtt:
+            shared_mqtt.release()
         if mqtt_client:
             mqtt_client.disconnect()
         logger.info(f"Device worker {device_id} shutting down")
@@ -1,7 +1,10 @@
 import json
 import os
 import logging
-from multiprocessing import Process
+import threading
+import time
+from multiprocessing import Process, Queue
+from queue import Empty
 from models import DeviceStatus
 from device import device_worker
 from device_types import device_type_registry
@@ -22,10 +25,56 @@ class DeviceManager:
             self.device_counters[device_type_impl.type_id] = 0
             
         self.logger = logging.getLogger('DeviceManager')
-        
+
+        # Shared measurement queue - all device workers feed into one queue
+        # which is drained in batches instead of each worker committing
+        # measurements individually
+        self._measurement_queue = Queue(maxsize=1024)
+        self._batch_size = 64
+        self._aggregator_thread = threading.Thread(
+            target=self._drain_measurement_queue, daemon=True)
+        self._aggregator_thread.start()
+
         # Load existing device status
         self._load_device_status()
-        
+
+    def _drain_measurement_queue(self):
+        """Drain the shared measurement queue and flush to the database in batches"""
+        while True:
+            try:
+                # Block for the first item, then collect whatever else is
+                # already queued up to the batch size
+                batch = [self._measurement_queue.get()]
+                while len(batch) < self._batch_size:
+                    try:
+                        batch.append(self._measurement_queue.get_nowait())
+                    except Empty:
+                        break
+
+                if hasattr(self.db, 'insert_measurements'):
+                    self.db.insert_measurements(batch)
+                else:
+                    for data in batch:
+                        self.db.insert_measurement(
+                            device_id=data['device_id'],
+                            timestamp=data['timestamp'],
+                            voltage=data['voltage'],
+                            current=data['current'],
+                            power=data['power'],
+                            kwh=data['kwh']
+                        )
+            except (OSError, EOFError) as e:
+                # The queue itself is broken (e.g. corrupted by a worker
+                # killed mid-put, or its handle closed) - get() will
+                # never succeed again, so exit instead of hot-spinning
+                self.logger.error(f"Measurement queue unusable, stopping aggregator: {e}")
+                break
+            except Exception as e:
+                self.logger.error(f"Error flushing measurement batch: {e}")
+                # Don't spin at full speed if the failure is persistent
+                # (e.g. the database is down)
+                time.sleep(1)
+
     def _load_device_status(self):
         """Load device status from JSON file"""
         if os.path.exists(self.status_file):
@@ -126,20 +175,16 @@ class DeviceManager:
         
     def _generate_device_id(self, device_type):
         """Generate a unique device ID based on type using abstraction"""
-        try:
-            device_type_impl = device_type_registry.get_device_type(device_type)
-            type_id = device_type_impl.type_id
-            
-            self.device_counters[type_id] += 1
-            counter = self.device_counters[type_id]
-            
-            return f'{type_id}{counter:03d}'
-        except ValueError:
-            # Fallback for unknown device types
-            self.device_counters.setdefault('unknown', 0)
-            self.device_counters['unknown'] += 1
-            counter = self.device_counters['unknown']
-            return f'unknown{counter:03d}'
+        device_type_impl = device_type_registry.get_device_type_or_none(device_type)
+
+        # Fall back to 'unknown' for unregistered device types
+        type_id = device_type_impl.type_id if device_type_impl else 'unknown'
+
+        self.device_counters.setdefault(type_id, 0)
+        self.device_counters[type_id] += 1
+        counter = self.device_counters[type_id]
+
+        return f'{type_id}{counter:03d}'
             
     def add_device(self, device_type):
         """Add a new device"""
@@ -177,7 +222,9 @@ class DeviceManager:
             from device_settings import device_settings
             interval = device_settings.get_measurement_interval()
             
-            process = Process(target=device_worker, args=(device_id, device_type, interval))
+            process = Process(target=device_worker,
+                              args=(device_id, device_type, interval,
+                                    self._measurement_queue))
             process.start()
             
             self.devices[device_id] = process
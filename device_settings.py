@@ -53,6 +53,13 @@ class DeviceSettings:
         
         self.settings['measurement_interval'] = interval
         self.save_settings()
+
+        # Invalidate the interval cached by measurement generation
+        try:
+            from device_types import invalidate_interval_cache
+            invalidate_interval_cache()
+        except Exception:
+            pass
     
     def get_all_settings(self) -> Dict[str, Any]:
         """Get all current settings"""
@@ -6,13 +6,115 @@ Provides abstraction layer for different device types and their specifications.
 from abc import ABC, abstractmethod
 import random
 import os
+import threading
+import time
 from typing import Dict, Any
 from datetime import datetime
 
+# Formatted-timestamp cache: measurements tick at >= 1 second intervals,
+# so the ISO string only needs to be rebuilt when the second changes
+_ts_cache = [0, '']
+
+
+def _iso_now() -> str:
+    """Current time as an ISO timestamp string, cached per second"""
+    sec = int(time.time())
+    if sec != _ts_cache[0]:
+        _ts_cache[0] = sec
+        _ts_cache[1] = datetime.fromtimestamp(sec).isoformat()
+    return _ts_cache[1]
+
+# Per-process cache of the running cumulative kWh per device. Seeded once
+# from the database on first use, then updated in memory so measurement
+# generation does not need a SELECT per tick.
+_kwh_cache: Dict[str, float] = {}
+_kwh_cache_lock = threading.Lock()
+
+# Cached measurement interval (in hours). The setting changes rarely but
+# is read on every measurement, so look it up once and reuse until
+# invalidate_interval_cache() is called.
+_interval_hours_cache = [None]
+
+
+def _get_interval_hours() -> float:
+    """Get the measurement interval in hours, cached across calls"""
+    if _interval_hours_cache[0] is None:
+        try:
+            from device_settings import device_settings
+            interval_seconds = device_settings.get_measurement_interval()
+        except Exception:
+            interval_seconds = 5  # Fallback to 5 seconds
+        _interval_hours_cache[0] = interval_seconds / 3600  # Convert to hours
+    return _interval_hours_cache[0]
+
+
+def invalidate_interval_cache():
+    """Drop the cached measurement interval after a settings change"""
+    _interval_hours_cache[0] = None
+
+
+# The database backend is selected once at import time - DATABASE_URL
+# does not change within a process lifetime
+_USE_POSTGRES = bool(os.environ.get("DATABASE_URL"))
+
+# Per-process database handle, created once. The PostgreSQL handler sits
+# on SQLAlchemy's engine pool (which also caches compiled statements), so
+# the only per-call cost worth removing is re-constructing the handler.
+_db_instance = [None]
+
+
+def _get_db():
+    """Get the per-process database handler, created on first use"""
+    if _db_instance[0] is None:
+        if _USE_POSTGRES:
+            from database_postgres import PostgresDatabase
+            _db_instance[0] = PostgresDatabase()
+        else:
+            from database import Database
+            _db_instance[0] = Database()
+    return _db_instance[0]
+
+
+def _round2(x: float) -> float:
+    """Round a positive value to 2 decimals via integer scaling"""
+    return int(x * 100 + 0.5) / 100
+
+
+def _round6(x: float) -> float:
+    """Round a positive value to 6 decimals via integer scaling"""
+    return int(x * 1000000 + 0.5) / 1000000
+
+
+def _generate_vip(rng: random.Random, voltage_range: tuple, current_range: tuple) -> tuple:
+    """Inner measurement kernel: draw voltage/current and derive power
+
+    Kept as a plain module-level function so the hot loop does a single
+    call with unpacked range tuples instead of repeated property
+    dispatch per value. Rounding uses integer scaling, which is cheaper
+    than round() and all measurement values are positive.
+    """
+    voltage = _round2(rng.uniform(*voltage_range))
+    current = _round2(rng.uniform(*current_range))
+
+    # Calculate power: P = V × I
+    power = _round2(voltage * current)
+    return voltage, current, power
+
 
 class DeviceTypeInterface(ABC):
     """Abstract base class for device types"""
-    
+
+    def __init__(self):
+        # Snapshot the range properties once - they are static per type,
+        # so measurement generation can use plain attributes instead of
+        # going through property dispatch on every tick
+        self._voltage_range = self.voltage_range
+        self._current_range = self.current_range
+
+        # Per-instance RNG so measurement draws do not contend on (or
+        # correlate through) the shared module-level random state
+        self._rng = random.Random()
+
     @property
     @abstractmethod
     def type_name(self) -> str:
@@ -37,55 +139,61 @@ class DeviceTypeInterface(ABC):
         """Return Bootstrap color class for UI styling"""
         pass
     
-    @abstractmethod
     def generate_measurement_data(self, device_id: str) -> Dict[str, Any]:
         """Generate realistic measurement data for this device type"""
-        pass
-    
+        voltage, current, power = _generate_vip(self._rng, self._voltage_range, self._current_range)
+
+        # Get previous kWh reading to calculate cumulative kWh
+        kwh = self._calculate_cumulative_kwh(device_id, power)
+
+        return {
+            'timestamp': _iso_now(),
+            'device_id': device_id,
+            'voltage': voltage,
+            'current': current,
+            'power': power,
+            'kwh': kwh
+        }
+
     def _calculate_cumulative_kwh(self, device_id: str, current_power: float) -> float:
         """Calculate cumulative kWh based on power consumption over time interval"""
         try:
-            # Get the last measurement from database to get previous kWh
-            database_url = os.environ.get("DATABASE_URL")
-            if database_url:
-                # Use PostgreSQL database
-                from database_postgres import PostgresDatabase
-                db = PostgresDatabase()
-                measurements = db.get_measurements(device_id=device_id, limit=1)
-            else:
-                # Use SQLite database
-                from database import Database
-                db = Database()
-                measurements = db.get_measurements(device_id=device_id, limit=1)
-            
-            # Get previous kWh value (start from 0 if no previous measurements)
-            previous_kwh = 0.0
-            if measurements:
-                previous_kwh = float(measurements[0].get('kwh', 0))
-            
+            with _kwh_cache_lock:
+                if device_id in _kwh_cache:
+                    previous_kwh = _kwh_cache[device_id]
+                else:
+                    # Seed the cache with the last persisted kWh reading -
+                    # one SELECT per device per process instead of one per tick
+                    previous_kwh = self._load_last_kwh(device_id)
+                    _kwh_cache[device_id] = previous_kwh
+
             # Calculate energy consumed in this interval
-            # Get interval from device settings or default to 5 seconds
-            try:
-                from device_settings import device_settings
-                interval_seconds = device_settings.get_measurement_interval()
-            except:
-                interval_seconds = 5  # Fallback to 5 seconds
-                
-            interval_hours = interval_seconds / 3600  # Convert to hours
-            
+            interval_hours = _get_interval_hours()
+
+
             # Energy = Power × Time (kWh = kW × hours)
             power_kw = current_power / 1000  # Convert watts to kilowatts
             energy_consumed = power_kw * interval_hours
             
-            # Add to previous cumulative total
-            new_kwh = previous_kwh + energy_consumed
-            
-            return round(new_kwh, 6)  # Round to 6 decimal places for precision
-            
+            # Add to previous cumulative total and remember it for next tick
+            new_kwh = _round6(previous_kwh + energy_consumed)  # 6 decimal places for precision
+
+            with _kwh_cache_lock:
+                _kwh_cache[device_id] = new_kwh
+
+            return new_kwh
+
         except Exception as e:
             # Fallback: return a small increment based on power
             power_kw = current_power / 1000
-            return round(power_kw * 0.001, 6)  # Small increment
+            return _round6(power_kw * 0.001)  # Small increment
+
+    def _load_last_kwh(self, device_id: str) -> float:
+        """Load the last persisted kWh reading for a device from the database"""
+        measurements = _get_db().get_measurements(device_id=device_id, limit=1)
+        if measurements:
+            return float(measurements[0].get('kwh', 0))
+        return 0.0
     
     @property
     @abstractmethod
@@ -136,25 +244,6 @@ class SolarPanelType(DeviceTypeInterface):
     @property
     def power_range(self) -> tuple:
         return (1000, 3000)
-    
-    def generate_measurement_data(self, device_id: str) -> Dict[str, Any]:
-        voltage = round(random.uniform(*self.voltage_range), 2)
-        current = round(random.uniform(*self.current_range), 2)
-        
-        # Calculate power: P = V × I
-        power = round(voltage * current, 2)
-        
-        # Get previous kWh reading to calculate cumulative kWh
-        kwh = self._calculate_cumulative_kwh(device_id, power)
-        
-        return {
-            'timestamp': datetime.now().isoformat(),
-            'device_id': device_id,
-            'voltage': voltage,
-            'current': current,
-            'power': power,
-            'kwh': kwh
-        }
 
 
 class HeatPumpType(DeviceTypeInterface):
@@ -187,25 +276,6 @@ class HeatPumpType(DeviceTypeInterface):
     @property
     def power_range(self) -> tuple:
         return (2000, 5000)
-    
-    def generate_measurement_data(self, device_id: str) -> Dict[str, Any]:
-        voltage = round(random.uniform(*self.voltage_range), 2)
-        current = round(random.uniform(*self.current_range), 2)
-        
-        # Calculate power: P = V × I
-        power = round(voltage * current, 2)
-        
-        # Get previous kWh reading to calculate cumulative kWh
-        kwh = self._calculate_cumulative_kwh(device_id, power)
-        
-        return {
-            'timestamp': datetime.now().isoformat(),
-            'device_id': device_id,
-            'voltage': voltage,
-            'current': current,
-            'power': power,
-            'kwh': kwh
-        }
 
 
 class MainGridType(DeviceTypeInterface):
@@ -238,25 +308,6 @@ class MainGridType(DeviceTypeInterface):
     @property
     def power_range(self) -> tuple:
         return (2500, 12000)
-    
-    def generate_measurement_data(self, device_id: str) -> Dict[str, Any]:
-        voltage = round(random.uniform(*self.voltage_range), 2)
-        current = round(random.uniform(*self.current_range), 2)
-        
-        # Calculate power: P = V × I
-        power = round(voltage * current, 2)
-        
-        # Get previous kWh reading to calculate cumulative kWh
-        kwh = self._calculate_cumulative_kwh(device_id, power)
-        
-        return {
-            'timestamp': datetime.now().isoformat(),
-            'device_id': device_id,
-            'voltage': voltage,
-            'current': current,
-            'power': power,
-            'kwh': kwh
-        }
 
 
 class DeviceTypeRegistry:
@@ -268,20 +319,85 @@ class DeviceTypeRegistry:
             'Heat Pump': HeatPumpType(),
             'Main Grid': MainGridType()
         }
+
+        # Flat range table keyed by type name so the batch path reads
+        # plain tuples instead of dispatching properties per device
+        self._range_table = {
+            name: (impl.voltage_range, impl.current_range)
+            for name, impl in self._device_types.items()
+        }
+
+        # Reverse index from type_id prefix to type name for O(1)
+        # device-ID lookups, plus a longest-first prefix list as a
+        # fallback for IDs that don't follow <type_id><counter>
+        self._name_by_type_id = {
+            impl.type_id: name for name, impl in self._device_types.items()
+        }
+        self._prefixes_sorted = sorted(self._name_by_type_id, key=len, reverse=True)
     
     def get_device_type(self, type_name: str) -> DeviceTypeInterface:
         """Get device type implementation by name"""
         if type_name not in self._device_types:
             raise ValueError(f"Unknown device type: {type_name}")
         return self._device_types[type_name]
+
+    def get_device_type_or_none(self, type_name: str):
+        """Get device type implementation by name, or None if unknown"""
+        return self._device_types.get(type_name)
     
     def get_all_type_names(self) -> list:
         """Get list of all available device type names"""
         return list(self._device_types.keys())
+
+    def generate_batch(self, devices: list) -> list:
+        """Generate measurement data for many devices in one pass
+
+        Args:
+            devices: list of (device_id, type_name) tuples
+
+        Amortizes the per-tick overhead across the fleet: the timestamp
+        and interval are computed once and the kWh cache lock is taken
+        once for the whole batch instead of per device.
+        """
+        timestamp = _iso_now()
+        interval_hours = _get_interval_hours()
+        results = []
+
+        with _kwh_cache_lock:
+            for device_id, type_name in devices:
+                impl = self._device_types.get(type_name)
+                if impl is None:
+                    continue
+
+                voltage_range, current_range = self._range_table[type_name]
+                voltage, current, power = _generate_vip(impl._rng, voltage_range, current_range)
+
+                if device_id in _kwh_cache:
+                    previous_kwh = _kwh_cache[device_id]
+                else:
+                    previous_kwh = impl._load_last_kwh(device_id)
+
+                kwh = _round6(previous_kwh + power / 1000 * interval_hours)
+                _kwh_cache[device_id] = kwh
+
+                results.append({
+                    'timestamp': timestamp,
+                    'device_id': device_id,
+                    'voltage': voltage,
+                    'current': current,
+                    'power': power,
+                    'kwh': kwh
+                })
+
+        return results
     
     def register_device_type(self, type_name: str, device_type: DeviceTypeInterface):
         """Register a new device type"""
         self._device_types[type_name] = device_type
+        self._range_table[type_name] = (device_type.voltage_range,
+                                        device_type.current_range)
+        self._name_by_type_id[device_type.type_id] = type_name
+        self._prefixes_sorted = sorted(self._name_by_type_id, key=len, reverse=True)
     
     def get_type_id_from_name(self, type_name: str) -> str:
         """Get the type ID for device naming from type name"""
@@ -289,9 +405,17 @@ class DeviceTypeRegistry:
     
     def get_type_name_from_id(self, device_id: str) -> str:
         """Extract device type name from device ID"""
-        for type_name, device_type in self._device_types.items():
-            if device_id.startswith(device_type.type_id):
-                return type_name
+        # Generated IDs are <type_id><counter>, so stripping the trailing
+        # digits gives a direct dict hit
+        type_name = self._name_by_type_id.get(device_id.rstrip('0123456789'))
+        if type_name:
+            return type_name
+
+        # Fallback for IDs that don't follow the naming convention:
+        # longest prefix wins
+        for prefix in self._prefixes_sorted:
+            if device_id.startswith(prefix):
+                return self._name_by_type_id[prefix]
         return 'Unknown'
 
 
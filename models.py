@@ -2,7 +2,9 @@ from datetime import datetime
 
 class DeviceStatus:
     """Model representing the status of a device"""
-    
+
+    __slots__ = ('device_id', 'device_type', 'status', 'created_at')
+
     def __init__(self, device_id, device_type, status='stopped', created_at=None):
         self.device_id = device_id
         self.device_type = device_type
@@ -30,7 +32,9 @@ class DeviceStatus:
 
 class Measurement:
     """Model representing a device measurement"""
-    
+
+    __slots__ = ('device_id', 'timestamp', 'voltage', 'current', 'power', 'kwh')
+
     def __init__(self, device_id, timestamp, voltage, current, power, kwh):
         self.device_id = device_id
         self.timestamp = timestamp
@@ -49,3 +53,15 @@ class Measurement:
             'power': self.power,
             'kwh': self.kwh
         }
+
+    @classmethod
+    def many_to_list(cls, measurements):
+        """Convert a batch of measurements to dicts in one pass"""
+        return [{
+            'device_id': m.device_id,
+            'timestamp': m.timestamp,
+            'voltage': m.voltage,
+            'current': m.current,
+            'power': m.power,
+            'kwh': m.kwh
+        } for m in measurements]
@@ -13,7 +13,14 @@ class DeviceMeasurement(db.Model):
     power = db.Column(db.Float, nullable=False)
     kwh = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
+
+    # Composite index matching the "latest measurement for a device"
+    # query (WHERE device_id = ? ORDER BY timestamp DESC LIMIT 1), so it
+    # becomes a single index probe instead of a scan + sort
+    __table_args__ = (
+        db.Index('ix_device_measurements_device_ts', device_id, timestamp.desc()),
+    )
+
     def __repr__(self):
         return f'<DeviceMeasurement {self.device_id} at {self.timestamp}>'
     
@@ -30,6 +37,20 @@ class DeviceMeasurement(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+    @classmethod
+    def many_to_list(cls, measurements):
+        """Convert a batch of measurement rows to dicts in one pass"""
+        return [{
+            'id': m.id,
+            'device_id': m.device_id,
+            'timestamp': m.timestamp.isoformat(),
+            'voltage': m.voltage,
+            'current': m.current,
+            'power': m.power,
+            'kwh': m.kwh,
+            'created_at': m.created_at.isoformat() if m.created_at else None
+        } for m in measurements]
+
 class DeviceConfig(db.Model):
     """PostgreSQL model for device configuration"""
     __tablename__ = 'device_configs'
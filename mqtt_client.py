@@ -2,23 +2,137 @@
 MQTT Client for Cumulocity IoT Platform Integration
 """
 
+import functools
 import json
 import logging
+import os
+import queue
+import socket
+import threading
 import time
 import ssl
 from typing import Dict, Any, Optional
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 from datetime import datetime
 
+try:
+    # Optional C-accelerated JSON parser, used when installed
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_loads(data):
+    """Parse JSON from bytes/str with orjson when available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj, indent: bool = True) -> bytes:
+    """Serialize to JSON bytes with orjson when available
+
+    indent=True pretty-prints (for the hand-editable settings file);
+    machine-only files use the compact form.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return (json.dumps(obj, indent=2) if indent else json.dumps(obj)).encode()
+
+
+# Formatted-timestamp cache for the send paths: payload times only need
+# second resolution, so the ISO string is rebuilt at most once per second
+# instead of once per publish
+_ts_cache = [0, '']
+
+
+def _iso_now() -> str:
+    """Current time as an ISO timestamp string, cached per second"""
+    sec = int(time.time())
+    if sec != _ts_cache[0]:
+        _ts_cache[0] = sec
+        _ts_cache[1] = datetime.fromtimestamp(sec).isoformat()
+    return _ts_cache[1]
+
+
+# Parsed device_status.json, shared by every client in the process and
+# keyed on file mtime: repeated registration checks hit the cache, while
+# writes (which bump the mtime) still invalidate it
+_status_cache = {'mtime': None, 'data': None}
+_status_cache_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=8)
+def _get_ssl_context(ca_cert_path: Optional[str],
+                     client_cert_path: Optional[str],
+                     client_key_path: Optional[str]) -> ssl.SSLContext:
+    """Build (or reuse) an SSL context for the given certificate paths
+
+    Parsing the CA bundle and client certificate is the expensive part
+    of TLS setup and the result only depends on the paths, so contexts
+    are cached and shared across all clients in the process. A shared
+    context also gives OpenSSL one TLS session cache, helping resumed
+    handshakes.
+    """
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+
+    # Trim the handshake: TLS 1.3 only (smaller, one-round-trip
+    # handshakes with ECDHE key exchange) and no compression or
+    # renegotiation. TLS 1.3 cipher suites are fixed by the protocol and
+    # cannot be restricted via set_ciphers(), which only accepts
+    # pre-1.3 cipher strings.
+    context.minimum_version = ssl.TLSVersion.TLSv1_3
+    context.options |= ssl.OP_NO_COMPRESSION
+    context.options |= getattr(ssl, 'OP_NO_RENEGOTIATION', 0)
+
+    # Load CA certificate if provided
+    if ca_cert_path:
+        context.load_verify_locations(ca_cert_path)
+
+    # Load client certificate and key if provided (for mutual TLS)
+    if client_cert_path and client_key_path:
+        context.load_cert_chain(client_cert_path, client_key_path)
+
+    return context
+
+
+# Characters not allowed in publish topics, checked in one set-disjoint
+# pass instead of three substring scans
+_TOPIC_WILDCARDS = frozenset('*+#')
+
+# CONNACK error descriptions, built once instead of on every failed
+# connection attempt
+_CONNECT_ERRORS = {
+    1: "Connection refused - incorrect protocol version",
+    2: "Connection refused - invalid client identifier",
+    3: "Connection refused - server unavailable",
+    4: "Connection refused - bad username or password",
+    5: "Connection refused - not authorized"
+}
+
+
+def _load_status_file(status_file: str):
+    """Load the registration status file, reusing the parse if unchanged"""
+    mtime = os.stat(status_file).st_mtime
+    with _status_cache_lock:
+        if mtime != _status_cache['mtime']:
+            with open(status_file, 'rb') as f:
+                _status_cache['data'] = _json_loads(f.read())
+            _status_cache['mtime'] = mtime
+        return _status_cache['data']
+
 class CumulocityMqttClient:
     """MQTT client for connecting to Cumulocity IoT platform"""
     
     def __init__(self, broker_host: str, broker_port: int = 1883, 
                  username: str = None, password: str = None, 
                  tenant: str = None, device_id: str = None,
-                 client_id: str = None, use_ssl: bool = False, 
-                 ca_cert_path: str = None, client_cert_path: str = None, 
-                 client_key_path: str = None):
+                 client_id: str = None, use_ssl: bool = False,
+                 ca_cert_path: str = None, client_cert_path: str = None,
+                 client_key_path: str = None,
+                 max_inflight: int = 20, max_queued: int = 1000,
+                 transport: str = 'tcp'):
         """
         Initialize Cumulocity MQTT client
         
@@ -31,8 +145,11 @@ class CumulocityMqttClient:
             device_id: Unique device identifier
             use_ssl: Enable SSL/TLS connection
             ca_cert_path: Path to CA certificate file
-            client_cert_path: Path to client certificate file  
+            client_cert_path: Path to client certificate file
             client_key_path: Path to client key file
+            max_inflight: Max concurrent in-flight QoS>0 messages
+            max_queued: Max outgoing messages queued in paho
+            transport: 'tcp' (default) or 'websockets'
         """
         self.broker_host = broker_host
         self.broker_port = broker_port
@@ -45,93 +162,211 @@ class CumulocityMqttClient:
         self.ca_cert_path = ca_cert_path
         self.client_cert_path = client_cert_path
         self.client_key_path = client_key_path
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.transport = transport
+
+        # Format the Cumulocity tenant/username once; connect() may run
+        # many times over a client's lifetime and the inputs never change
+        self._formatted_username = None
+        if username:
+            self._formatted_username = username
+            if tenant and '/' not in username:
+                self._formatted_username = f"{tenant}/{username}"
+            elif '/' not in username:
+                logging.getLogger(f'MQTT-{device_id}').warning(
+                    "Username should be in format 'tenant/username' for Cumulocity")
+
         self.client = None
         self.connected = False
+        self._ssl_context = None  # Built once, reused across reconnects
+        self._connected_event = threading.Event()
+        self._pending_publishes = {}  # mid -> Event, set from _on_publish
+        self._pending_lock = threading.Lock()
+
+        # Outgoing measurement queue drained by a dedicated publisher
+        # thread, so callers never block in paho's socket write path
+        self._tx_queue = None
+        self._tx_thread = None
+        self._tx_dropped = 0
+
+        # MQTT v5 topic aliases: once the broker advertises support in
+        # CONNACK, repeat publishes to the same topic carry a 2-byte
+        # alias instead of the full topic string
+        self._broker_alias_max = 0
+        self._topic_aliases = {}
+        self._alias_generation = 0  # Bumped per connection; stale entries must not be reused
+
+        self._subscribed_commands = False  # s/ds subscribed this connection
         self.registered = False
         self.last_message_time = None
         self.logger = logging.getLogger(f'MQTT-{device_id}')
         
-        # Reconnection parameters
-        self.reconnect_delay = 5  # Start with 5 seconds
-        self.max_reconnect_delay = 300  # Max 5 minutes
+        # Reconnection is delegated to paho's network loop (configured
+        # via reconnect_delay_set in connect()), which retries with
+        # backoff on its own thread; we only count attempts for the
+        # health report
         self.reconnect_attempts = 0
-        self.max_reconnect_attempts = 50  # Try for about 4 hours max
+        self.max_reconnect_attempts = 50
         self.auto_reconnect = True
-        self._reconnect_thread = None
         
         # Connection monitoring
         self.last_heartbeat = None
         self.heartbeat_interval = 60  # Send heartbeat every 60 seconds
         self._heartbeat_thread = None
+        self._stop_event = threading.Event()  # Wakes the heartbeat loop on shutdown
         
         # Cumulocity MQTT topics
         self.measurement_topic = "s/us"  # Static template for measurements
         self.inventory_topic = f"s/ud/{device_id}"  # Device registration
         self.command_topic = "s/ds"  # Device commands subscription
+
+        # Constant SmartREST rows, encoded once at construction so the
+        # send paths hand paho ready-made bytes instead of rebuilding
+        # and re-encoding the same strings on every publish
+        # SmartREST accepts several rows per publish separated by
+        # newlines, so the 110 hardware info and 114 supported operations
+        # ride in a single message
+        self._metadata_msg = (
+            f"110,{device_id},IoT Simulator Model,v1.0\n"
+            f"114,c8y_Restart,c8y_Configuration"
+        ).encode()
+        self._restart_ack = b"501,c8y_Restart"
+        self._restart_done = b"503,c8y_Restart"
+        self._heartbeat_msg = b"400,Connection heartbeat"
+
+        # SmartREST operation dispatch table, keyed by the raw message ID
+        # bytes so routing needs no payload decode. New operations plug
+        # in here instead of growing an if/elif chain in the callback
+        self._command_handlers = {
+            b'510': self._handle_restart_command,  # c8y_Restart
+        }
+
+        # Pre-built JSON payload templates for send_measurement - the
+        # schema is fixed, so interpolating values into a template avoids
+        # rebuilding the nested dicts and running json.dumps per publish
+        self._payload_template = (
+            '{{"type":"c8y_ElectricMeasurement","time":"{t}",'
+            '"c8y_ElectricMeasurement":{{'
+            '"voltage":{{"value":{v},"unit":"V"}},'
+            '"current":{{"value":{i},"unit":"A"}},'
+            '"power":{{"value":{p},"unit":"W"}}}}}}'
+        )
+        self._payload_template_kwh = (
+            '{{"type":"c8y_ElectricMeasurement","time":"{t}",'
+            '"c8y_ElectricMeasurement":{{'
+            '"voltage":{{"value":{v},"unit":"V"}},'
+            '"current":{{"value":{i},"unit":"A"}},'
+            '"power":{{"value":{p},"unit":"W"}},'
+            '"energy":{{"value":{e},"unit":"kWh"}}}}}}'
+        )
         
     def connect(self) -> bool:
         """Connect to Cumulocity MQTT broker"""
         try:
-            # Use MQTT version 3.1.1 for Cumulocity compatibility
+            # Start each attempt from a cleared event so a stale signal
+            # from a previous session cannot satisfy the wait below
+            self._connected_event.clear()
+
+            # Make sure a publisher thread is draining _tx_queue before
+            # either connect path runs — disconnect() stops the drainer
+            # but leaves the queue in place, so a reconnect on the same
+            # instance would otherwise enqueue into a dead queue
+            if self._tx_thread is None or not self._tx_thread.is_alive():
+                self._tx_queue = queue.Queue(maxsize=10000)
+                self._tx_thread = threading.Thread(
+                    target=self._publisher_loop, args=(self._tx_queue,), daemon=True)
+                self._tx_thread.start()
+
+            # Reuse the existing client when there is one: paho's
+            # reconnect() re-dials with the stored options, keeping the
+            # persistent MQTT v5 session and the TLS session cache warm
+            # instead of paying full client + handshake setup again
+            if self.client is not None:
+                try:
+                    self.client.reconnect()
+                    self.client.loop_start()  # No-op if the loop is already running
+
+                    if not self._connected_event.wait(timeout=10):
+                        self.logger.error("Reconnect not acknowledged within 10 seconds")
+                        return False
+                    return self.connected
+                except Exception as e:
+                    self.logger.warning(f"Reconnect with existing client failed ({e}) - rebuilding client")
+                    try:
+                        self.client.loop_stop()
+                    except Exception:
+                        pass
+                    self.client = None
+
+            # Use MQTT v5 so the broker can keep the session alive across
+            # reconnects (clean_start=False below) instead of rebuilding
+            # subscriptions every time
             # Each device gets its own unique client ID (like your example script)
             self.client = mqtt.Client(
-                client_id=self.client_id, 
-                protocol=mqtt.MQTTv311
+                client_id=self.client_id,
+                protocol=mqtt.MQTTv5,
+                transport=self.transport
             )
             self.logger.info(f"Created MQTT client with unique ID: {self.client_id}")
             
-            # Set authentication if provided
-            if self.username and self.password:
-                # Ensure username includes tenant if not already formatted correctly
-                formatted_username = self.username
-                if self.tenant and '/' not in self.username:
-                    formatted_username = f"{self.tenant}/{self.username}"
-                elif '/' not in self.username:
-                    self.logger.warning("Username should be in format 'tenant/username' for Cumulocity")
-                
-                self.client.username_pw_set(formatted_username, self.password)
-                self.logger.info(f"Authentication set for user: {formatted_username}")
+            # Set authentication if provided (username pre-formatted with
+            # the tenant in __init__)
+            if self._formatted_username and self.password:
+                self.client.username_pw_set(self._formatted_username, self.password)
+                self.logger.info(f"Authentication set for user: {self._formatted_username}")
             
-            # Configure SSL/TLS if enabled
+            # Configure SSL/TLS if enabled - the context (and the CA /
+            # client cert parsing it implies) is built once and reused
+            # across reconnects, which also lets OpenSSL reuse TLS
+            # sessions for faster resumed handshakes
             if self.use_ssl:
-                context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
-                
-                # Load CA certificate if provided
-                if self.ca_cert_path:
-                    context.load_verify_locations(self.ca_cert_path)
-                
-                # Load client certificate and key if provided (for mutual TLS)
-                if self.client_cert_path and self.client_key_path:
-                    context.load_cert_chain(self.client_cert_path, self.client_key_path)
-                
-                # Set SSL context
-                self.client.tls_set_context(context)
+                if self._ssl_context is None:
+                    self._ssl_context = _get_ssl_context(
+                        self.ca_cert_path or None,
+                        self.client_cert_path or None,
+                        self.client_key_path or None)
+                self.client.tls_set_context(self._ssl_context)
                 self.logger.info(f"SSL/TLS enabled for connection to {self.broker_host}:{self.broker_port}")
             
+            # Bound paho's outgoing queue and allow several in-flight
+            # messages so throughput survives a slow broker without
+            # unbounded memory growth; configure its reconnect backoff
+            self.client.max_inflight_messages_set(self.max_inflight)
+            self.client.max_queued_messages_set(self.max_queued)
+            self.client.reconnect_delay_set(min_delay=1, max_delay=30)
+
             # Set callbacks
             self.client.on_connect = self._on_connect
             self.client.on_disconnect = self._on_disconnect
             self.client.on_publish = self._on_publish
             self.client.on_message = self._on_message
-            self.client.on_log = self._on_log
+            # Only hook paho's per-packet log callback when DEBUG is on;
+            # with no callback registered paho skips it entirely
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.client.on_log = self._on_log
             
-            # Connect to broker
+            # Connect to broker with a persistent session so a reconnect
+            # under the same (stable) client ID resumes where it left off
+            connect_properties = Properties(PacketTypes.CONNECT)
+            connect_properties.SessionExpiryInterval = 3600
+            # Allow the broker to use aliases on traffic it sends us
+            connect_properties.TopicAliasMaximum = 10
+
             self.logger.info(f"Connecting to Cumulocity broker {self.broker_host}:{self.broker_port}")
-            self.client.connect(self.broker_host, self.broker_port, 60)
+            self.client.connect(self.broker_host, self.broker_port, 60,
+                                clean_start=False, properties=connect_properties)
             
             # Start network loop
             self.client.loop_start()
-            
-            # Wait for connection
-            timeout = 10
-            while not self.connected and timeout > 0:
-                time.sleep(0.5)
-                timeout -= 0.5
-            
-            if not self.connected:
-                self.logger.error(f"Failed to connect to MQTT broker within {10} seconds")
+
+            # Wait for connection - the event is set from _on_connect, so
+            # this returns as soon as the broker acknowledges instead of
+            # polling in 0.5s steps
+            if not self._connected_event.wait(timeout=10):
+                self.logger.error("Failed to connect to MQTT broker within 10 seconds")
                 return False
-                
+
             return self.connected
             
         except Exception as e:
@@ -142,11 +377,18 @@ class CumulocityMqttClient:
         """Disconnect from MQTT broker"""
         # Disable auto-reconnect for manual disconnection
         self.auto_reconnect = False
-        
+        self._stop_event.set()
+
+        # Stop the publisher thread via its sentinel
+        if self._tx_queue is not None:
+            self._tx_queue.put(None)
+            self._tx_thread = None
+
         if self.client:
             self.client.loop_stop()
             self.client.disconnect()
             self.connected = False
+            self._connected_event.clear()
             self.registered = False
             self.last_message_time = None
             self.logger.info("Disconnected from MQTT broker")
@@ -168,68 +410,74 @@ class CumulocityMqttClient:
             if not force_register:
                 reg_status = self._get_registration_status()
                 if reg_status['is_registered']:
-                    self.logger.info(f"✓ Device '{self.device_id}' already registered in Cumulocity as '{reg_status['device_name']}' - skipping registration")
+                    self.logger.info("✓ Device '%s' already registered in Cumulocity as '%s' - skipping registration",
+                                     self.device_id, reg_status['device_name'])
                     self.registered = True
-                    
+
                     # Still subscribe to commands
-                    self.client.subscribe("s/ds")
-                    self.logger.info("Subscribed to device commands topic (s/ds)")
+                    self._subscribe_commands()
                     return True
                 else:
-                    self.logger.info(f"Device '{self.device_id}' not yet registered - proceeding with registration")
+                    self.logger.info("Device '%s' not yet registered - proceeding with registration", self.device_id)
             
             # Subscribe to device commands first
-            self.client.subscribe("s/ds")
-            self.logger.info("Subscribed to device commands topic (s/ds)")
-            
-            # Device registration message using static template
-            # 100,<device_name>,<device_type>
-            registration_msg = f"100,{device_name},c8y_MQTTDevice"
-            
-            result = self.client.publish("s/us", registration_msg, qos=2)
-            result.wait_for_publish()
-            
+            self._subscribe_commands()
+
+            # Single three-row publish: registration (100) plus the
+            # pre-encoded hardware/operations metadata (110/114).
+            # SmartREST processes the rows in order, so the device exists
+            # before its metadata is applied.
+            #
+            # QoS 1 is enough here: all three templates are idempotent on
+            # the Cumulocity side, so at-least-once delivery avoids the
+            # extra PUBREC/PUBREL/PUBCOMP round trips of QoS 2. Not
+            # blocking on wait_for_publish keeps startup latency off the
+            # broker RTT; paho retries delivery from its in-flight queue.
+            registration_msg = f"100,{device_name},c8y_MQTTDevice\n".encode() + self._metadata_msg
+
+            result = self.client.publish("s/us", registration_msg, qos=1)
+
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                self.logger.info(f"✓ Device '{self.device_id}' registered in Cumulocity as '{device_name}' (FIRST TIME)")
+                self.logger.info("✓ Device '%s' registered in Cumulocity as '%s' (FIRST TIME)",
+                                 self.device_id, device_name)
                 self.registered = True
                 
                 # Mark device as registered in persistent storage
                 self._mark_device_registered(device_name)
-                
-                # Send device hardware info (110 template)
-                hardware_msg = f"110,{self.device_id},IoT Simulator Model,v1.0"
-                hw_result = self.client.publish("s/us", hardware_msg)
-                
-                # Send supported operations (114 template)
-                operations_msg = "114,c8y_Restart,c8y_Configuration"
-                ops_result = self.client.publish("s/us", operations_msg)
-                
-                if hw_result.rc == mqtt.MQTT_ERR_SUCCESS and ops_result.rc == mqtt.MQTT_ERR_SUCCESS:
-                    self.logger.info(f"Device metadata sent for {device_name}")
-                
+
                 return True
             else:
-                self.logger.error(f"Failed to send device registration: {result.rc}")
+                self.logger.error("Failed to send device registration: %s", result.rc)
                 return False
                 
         except Exception as e:
-            self.logger.error(f"Error registering device: {e}")
+            self.logger.error("Error registering device: %s", e)
             return False
     
+    def _subscribe_commands(self):
+        """Subscribe to the device command topic, once per connection
+
+        register_device() can run several times (forced re-registration,
+        already-registered short-circuit); the flag keeps it from sending
+        duplicate SUBSCRIBE packets. Reset on disconnect.
+        """
+        if self._subscribed_commands:
+            return
+        self.client.subscribe("s/ds")
+        self._subscribed_commands = True
+        self.logger.info("Subscribed to device commands topic (s/ds)")
+
     def _get_registration_status(self) -> dict:
         """Get detailed registration status for device"""
         try:
-            import json
-            import os
-            
             status_file = 'device_status.json'
             if not os.path.exists(status_file):
-                self.logger.debug(f"No status file found - device {self.device_id} not registered")
+                self.logger.debug("No status file found - device %s not registered", self.device_id)
                 return {'is_registered': False, 'device_name': None, 'registered_at': None}
-                
-            with open(status_file, 'r') as f:
-                status_data = json.load(f)
-            
+
+            status_data = _load_status_file(status_file)
+
+
             devices = status_data.get('devices', {})
             device_info = devices.get(self.device_id, {})
             
@@ -244,46 +492,52 @@ class CumulocityMqttClient:
             }
             
             if is_registered:
-                self.logger.debug(f"Device {self.device_id} found in registration cache as '{device_name}' (registered: {registered_at})")
+                self.logger.debug("Device %s found in registration cache as '%s' (registered: %s)",
+                                  self.device_id, device_name, registered_at)
             else:
-                self.logger.debug(f"Device {self.device_id} not found in registration cache or not registered")
+                self.logger.debug("Device %s not found in registration cache or not registered", self.device_id)
             
             return result
             
         except Exception as e:
-            self.logger.warning(f"Could not check registration status: {e}")
+            self.logger.warning("Could not check registration status: %s", e)
             return {'is_registered': False, 'device_name': None, 'registered_at': None}
     
     def _mark_device_registered(self, device_name: str):
         """Mark device as registered in persistent storage"""
         try:
-            import json
-            import os
-            
             status_file = 'device_status.json'
+
+            # Reuse the cached parse instead of re-reading the file
             status_data = {}
-            
             if os.path.exists(status_file):
-                with open(status_file, 'r') as f:
-                    status_data = json.load(f)
-            
-            if 'devices' not in status_data:
-                status_data['devices'] = {}
-                
-            if self.device_id not in status_data['devices']:
-                status_data['devices'][self.device_id] = {}
-            
-            status_data['devices'][self.device_id]['cumulocity_registered'] = True
-            status_data['devices'][self.device_id]['cumulocity_device_name'] = device_name
-            status_data['devices'][self.device_id]['cumulocity_registered_at'] = datetime.now().isoformat()
-            
-            with open(status_file, 'w') as f:
-                json.dump(status_data, f, indent=2)
-                
-            self.logger.info(f"Marked device {self.device_id} as registered in Cumulocity with name '{device_name}'")
+                status_data = _load_status_file(status_file)
+
+            with _status_cache_lock:
+                device_info = status_data.setdefault('devices', {}).setdefault(self.device_id, {})
+                device_info['cumulocity_registered'] = True
+                device_info['cumulocity_device_name'] = device_name
+                device_info['cumulocity_registered_at'] = datetime.now().isoformat()
+
+                # Write to a temp file and atomically swap it in, so
+                # devices reading device_status.json concurrently never
+                # see a partially written file. Compact form - the file
+                # is only read by machines
+                tmp_file = f"{status_file}.tmp"
+                with open(tmp_file, 'wb') as f:
+                    f.write(_json_dumps(status_data, indent=False))
+                os.replace(tmp_file, status_file)
+
+                # Keep the cache current so readers skip the re-parse the
+                # mtime bump would otherwise trigger
+                _status_cache['data'] = status_data
+                _status_cache['mtime'] = os.stat(status_file).st_mtime
+
+            self.logger.info("Marked device %s as registered in Cumulocity with name '%s'",
+                             self.device_id, device_name)
             
         except Exception as e:
-            self.logger.warning(f"Could not mark device as registered: {e}")
+            self.logger.warning("Could not mark device as registered: %s", e)
     
     def send_measurement(self, measurement_data: Dict[str, Any]) -> bool:
         """
@@ -302,78 +556,176 @@ class CumulocityMqttClient:
         """
         try:
             if not self.connected:
-                self.logger.warning("Not connected to MQTT broker - attempting reconnection")
-                # Try to reconnect if auto-reconnect is enabled
-                if self.auto_reconnect and self.reconnect_attempts < self.max_reconnect_attempts:
-                    if self._attempt_reconnection():
-                        self.logger.info("Successfully reconnected for measurement sending")
-                    else:
-                        return False
-                else:
-                    return False
-            
-            timestamp = measurement_data.get('timestamp', datetime.now().isoformat())
-            device_id = measurement_data.get('device_id', self.device_id)
-            
-            # Create proper JSON measurement payload for Cumulocity
-            import json
-            payload = {
-                "type": "c8y_ElectricMeasurement",
-                "time": timestamp,
-                "c8y_ElectricMeasurement": {
-                    "voltage": {
-                        "value": measurement_data['voltage'],
-                        "unit": "V"
-                    },
-                    "current": {
-                        "value": measurement_data['current'], 
-                        "unit": "A"
-                    },
-                    "power": {
-                        "value": measurement_data['power'],
-                        "unit": "W"
-                    }
-                }
-            }
-            
-            json_payload = json.dumps(payload)
-            
-            # Publish to JSON measurement topic instead of SmartREST
-            json_topic = f"measurement/measurements/create"
-            result = self.client.publish(json_topic, json_payload)
+                # paho's network loop reconnects in the background with
+                # its own backoff; don't stall the send path waiting on it
+                self.logger.warning("Not connected to MQTT broker - skipping measurement")
+                return False
+
+            # dict.get evaluates its default eagerly; measurements always
+            # carry a timestamp, so only fall back when it is missing
+            timestamp = measurement_data.get('timestamp') or _iso_now()
+
+            # Create proper JSON measurement payload for Cumulocity from
+            # the pre-built template (energy is bundled when present)
+            if 'kwh' in measurement_data:
+                json_payload = self._payload_template_kwh.format(
+                    t=timestamp,
+                    v=measurement_data['voltage'],
+                    i=measurement_data['current'],
+                    p=measurement_data['power'],
+                    e=measurement_data['kwh']
+                )
+            else:
+                json_payload = self._payload_template.format(
+                    t=timestamp,
+                    v=measurement_data['voltage'],
+                    i=measurement_data['current'],
+                    p=measurement_data['power']
+                )
             
+            # Publish to JSON measurement topic instead of SmartREST.
+            # Encode here so paho gets bytes and skips its own str check
+            # and utf-8 conversion on every publish
+            json_topic = "measurement/measurements/create"
+
+            # Hand off to the publisher thread instead of writing to the
+            # socket here, so a slow broker never stalls the device tick
+            if self._enqueue_publish(json_topic, json_payload.encode()):
+                # Single isEnabledFor check instead of four logging calls
+                # per tick when INFO is off
+                if self.logger.isEnabledFor(logging.INFO):
+                    # device_id is only needed for this log line; one
+                    # logging call means one handler-lock acquisition
+                    device_id = measurement_data.get('device_id') or self.device_id
+                    self.logger.info(
+                        "📊 Device '%s' queued JSON measurement (⚡ %sV, %sA, %sW)",
+                        device_id, measurement_data['voltage'],
+                        measurement_data['current'], measurement_data['power'])
+                    self.logger.debug("   📡 JSON Payload to %s: %s", json_topic, json_payload)
+                return True
+            else:
+                self.logger.error("Failed to publish JSON measurement to %s", json_topic)
+                return False
+
+        except Exception as e:
+            self.logger.error("Error sending JSON measurement: %s", e)
+            return False
+    
+    def send_measurements(self, batch) -> bool:
+        """
+        Send a batch of measurements in a single MQTT publish
+
+        Builds one JSON array from the per-measurement payload templates
+        and publishes it to Cumulocity's bulk measurement topic, so N
+        samples cost one publish instead of N.
+        """
+        try:
+            if not batch:
+                return True
+
+            if not self.connected:
+                self.logger.warning("Not connected to MQTT broker")
+                return False
+
+            payloads = []
+            for measurement_data in batch:
+                timestamp = measurement_data.get('timestamp') or _iso_now()
+                if 'kwh' in measurement_data:
+                    payloads.append(self._payload_template_kwh.format(
+                        t=timestamp,
+                        v=measurement_data['voltage'],
+                        i=measurement_data['current'],
+                        p=measurement_data['power'],
+                        e=measurement_data['kwh']
+                    ))
+                else:
+                    payloads.append(self._payload_template.format(
+                        t=timestamp,
+                        v=measurement_data['voltage'],
+                        i=measurement_data['current'],
+                        p=measurement_data['power']
+                    ))
+
+            json_payload = '{"measurements":[' + ','.join(payloads) + ']}'
+            result = self.client.publish("measurement/measurements/createBulk",
+                                         json_payload.encode())
+
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
                 self.last_message_time = datetime.now()
-                self.logger.info(f"📊 Device '{device_id}' sent JSON measurement to Cumulocity successfully")
-                self.logger.info(f"   ⚡ Voltage: {measurement_data['voltage']}V, Current: {measurement_data['current']}A, Power: {measurement_data['power']}W")
-                self.logger.debug(f"   📡 JSON Topic: {json_topic}")
-                self.logger.debug(f"   📡 JSON Payload: {json_payload}")
+                self.logger.info("📊 Device '%s' sent batch of %d measurements to Cumulocity",
+                                 self.device_id, len(batch))
                 return True
             else:
-                self.logger.error(f"Failed to publish JSON measurement to {json_topic}: {result.rc}")
+                if result.rc == mqtt.MQTT_ERR_NO_CONN:
+                    self.connected = False
+                self.logger.error("Failed to publish measurement batch: %s", result.rc)
                 return False
-                
+
         except Exception as e:
-            self.logger.error(f"Error sending JSON measurement: {e}")
+            self.logger.error("Error sending measurement batch: %s", e)
             return False
-    
+
+    def send_measurement_batch(self, measurements) -> bool:
+        """
+        Send many measurements as newline-joined SmartREST rows
+
+        SmartREST counterpart to send_measurements(): every 200-template
+        row is an independent measurement, so N readings collapse into a
+        single QoS 0 publish on s/us instead of N publishes (one TCP
+        segment and one paho lock acquisition for the whole batch).
+        """
+        try:
+            if not measurements:
+                return True
+
+            if not self.connected:
+                self.logger.warning("Not connected to MQTT broker")
+                return False
+
+            rows = []
+            for m in measurements:
+                ts = m.get('timestamp') or _iso_now()
+                rows.append(f"200,c8y_ElectricMeasurement,voltage,{m['voltage']},V,{ts}")
+                rows.append(f"200,c8y_ElectricMeasurement,current,{m['current']},A,{ts}")
+                rows.append(f"200,c8y_ElectricMeasurement,power,{m['power']},W,{ts}")
+                if 'kwh' in m:
+                    rows.append(f"200,c8y_ElectricMeasurement,energy,{m['kwh']},kWh,{ts}")
+
+            result = self.client.publish(self.measurement_topic, "\n".join(rows).encode(), qos=0)
+
+            if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                self.last_message_time = datetime.now()
+                self.logger.info("📊 Device '%s' sent SmartREST batch of %d measurements",
+                                 self.device_id, len(measurements))
+                return True
+
+            if result.rc == mqtt.MQTT_ERR_NO_CONN:
+                self.connected = False
+            self.logger.error("Failed to publish SmartREST measurement batch: %s", result.rc)
+            return False
+
+        except Exception as e:
+            self.logger.error("Error sending SmartREST measurement batch: %s", e)
+            return False
+
     def send_alarm(self, alarm_type: str, alarm_text: str, severity: str = "MINOR") -> bool:
         """Send alarm to Cumulocity"""
         try:
             # Alarm template: 301,<alarm_type>,<alarm_text>,<severity>
-            alarm_msg = f"301,{alarm_type},{alarm_text},{severity}"
-            
+            # Pre-encoded so paho doesn't re-encode inside publish()
+            alarm_msg = f"301,{alarm_type},{alarm_text},{severity}".encode()
+
             result = self.client.publish(self.measurement_topic, alarm_msg)
             
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                self.logger.info(f"Alarm sent: {alarm_type} - {alarm_text}")
+                self.logger.info("Alarm sent: %s - %s", alarm_type, alarm_text)
                 return True
             else:
-                self.logger.error(f"Failed to send alarm: {result.rc}")
+                self.logger.error("Failed to send alarm: %s", result.rc)
                 return False
-                
+
         except Exception as e:
-            self.logger.error(f"Error sending alarm: {e}")
+            self.logger.error("Error sending alarm: %s", e)
             return False
     
     def send_test_message(self, topic: str = None, message: str = None) -> bool:
@@ -383,160 +735,273 @@ class CumulocityMqttClient:
                 self.logger.warning("Not connected to MQTT broker")
                 return False
             
-            # Validate topic for MQTT compliance
-            if topic and ('*' in topic or '+' in topic or '#' in topic):
+            # Validate topic for MQTT compliance - single scan over the
+            # topic instead of one substring search per wildcard
+            if topic and not _TOPIC_WILDCARDS.isdisjoint(topic):
                 self.logger.error("Topic cannot contain MQTT wildcards (* + #)")
                 return False
             
             # Use default topic and message if not provided
             test_topic = topic or self.measurement_topic
-            test_message = message or f"400,Test message from IoT simulator,{datetime.now().isoformat()}"
+            test_message = message or f"400,Test message from IoT simulator,{_iso_now()}"
             
-            result = self.client.publish(test_topic, test_message)
+            result = self.client.publish(test_topic, test_message.encode())
             
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                self.logger.info(f"Test message sent to topic '{test_topic}': {test_message}")
+                self.logger.info("Test message sent to topic '%s': %s", test_topic, test_message)
                 return True
             else:
-                self.logger.error(f"Failed to send test message: {result.rc}")
+                self.logger.error("Failed to send test message: %s", result.rc)
                 return False
                 
         except Exception as e:
-            self.logger.error(f"Error sending test message: {e}")
+            self.logger.error("Error sending test message: %s", e)
             return False
     
-    def _on_connect(self, client, userdata, flags, rc):
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
         """Callback for MQTT connection"""
+        # Under MQTT v5 paho passes a ReasonCode object; normalize to int
+        # but keep the original for its human-readable description
+        reason = rc
+        rc = rc.value if hasattr(rc, 'value') else rc
         if rc == 0:
+            # Topic aliases are per-connection state: bump the generation
+            # so the publisher thread discards entries from the previous
+            # session, reset ours and pick up how many the broker accepts
+            # from the CONNACK properties
+            self._alias_generation += 1
+            self._topic_aliases = {}
+            self._broker_alias_max = getattr(properties, 'TopicAliasMaximum', 0) or 0
+
             self.connected = True
+            self._connected_event.set()
             self.reconnect_attempts = 0  # Reset on successful connection
             self.last_heartbeat = datetime.now()
             self.logger.info(f"✓ Device '{self.device_id}' connected to Cumulocity MQTT broker ({self.broker_host})")
-            
+
+            # Disable Nagle so small SmartREST rows flush immediately
+            # instead of waiting to be coalesced (saves up to ~40ms per
+            # publish); best-effort since websockets may not expose the
+            # raw socket
+            try:
+                sock = client.socket()
+                if sock is not None:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except Exception as e:
+                self.logger.debug("Could not set TCP_NODELAY: %s", e)
+
             # Start heartbeat monitoring
+            self._stop_event.clear()
             self._start_heartbeat()
         else:
             self.connected = False
-            error_messages = {
-                1: "Connection refused - incorrect protocol version",
-                2: "Connection refused - invalid client identifier",
-                3: "Connection refused - server unavailable", 
-                4: "Connection refused - bad username or password",
-                5: "Connection refused - not authorized"
-            }
-            error_msg = error_messages.get(rc, f"Unknown error code {rc}")
+            # Under MQTT v5 the refusal arrives as a v5 reason code (e.g.
+            # 134 bad user name or password), so prefer paho's own
+            # ReasonCode description over the legacy v3 CONNACK table
+            if hasattr(reason, 'value'):
+                error_msg = str(reason)
+            else:
+                error_msg = _CONNECT_ERRORS.get(rc, f"Unknown error code {rc}")
             self.logger.error(f"Failed to connect to MQTT broker: {error_msg} (code {rc})")
+            # Wake the connect() waiter immediately on a refused CONNACK
+            # rather than letting it sit out the full timeout; it returns
+            # self.connected, which is False here
+            self._connected_event.set()
     
-    def _on_disconnect(self, client, userdata, rc):
+    def _on_disconnect(self, client, userdata, rc, properties=None):
         """Callback for MQTT disconnection"""
+        rc = rc.value if hasattr(rc, 'value') else rc
         self.connected = False
+        self._subscribed_commands = False
         if rc != 0:
-            self.logger.warning(f"Unexpected disconnection from MQTT broker: {rc}")
-            # Start automatic reconnection if enabled
-            if self.auto_reconnect and self.reconnect_attempts < self.max_reconnect_attempts:
-                self.logger.info("Starting automatic reconnection...")
-                self._start_reconnect()
+            self.reconnect_attempts += 1
+            self.logger.warning("Unexpected disconnection from MQTT broker: %s", rc)
+            if self.auto_reconnect:
+                # paho's loop thread retries with the backoff configured
+                # via reconnect_delay_set; nothing to do here
+                self.logger.info("Automatic reconnection in progress...")
         else:
             self.logger.info("Cleanly disconnected from MQTT broker")
     
+    def _enqueue_publish(self, topic: str, payload, qos: int = 0) -> bool:
+        """Hand a publish to the background publisher thread
+
+        Bounded at 10000 entries; on overflow the oldest queued message
+        is dropped so the freshest measurements keep flowing.
+        """
+        if self._tx_queue is None:
+            # Publisher not running yet - publish inline as before
+            result = self.client.publish(topic, payload, qos)
+            return result.rc == mqtt.MQTT_ERR_SUCCESS
+
+        try:
+            self._tx_queue.put_nowait((topic, payload, qos))
+        except queue.Full:
+            try:
+                self._tx_queue.get_nowait()  # Drop oldest
+            except queue.Empty:
+                pass
+            try:
+                self._tx_queue.put_nowait((topic, payload, qos))
+            except queue.Full:
+                pass
+            self._tx_dropped += 1
+            self.logger.debug("Publish queue full - dropped oldest message (total dropped: %d)",
+                              self._tx_dropped)
+        return True
+
+    def _publisher_loop(self, tx_queue):
+        """Drain the outgoing queue onto the MQTT client
+
+        The queue is bound at thread start: after a disconnect/connect
+        cycle swaps in a fresh queue, the old thread keeps draining its
+        own queue until it reaches the sentinel, instead of migrating to
+        the new one and racing the replacement thread.
+        """
+        while True:
+            item = tx_queue.get()
+            if item is None:  # Sentinel from disconnect()
+                break
+
+            topic, payload, qos = item
+            try:
+                # Single rc check per publish: at QoS 0 paho only fails
+                # when the socket is gone, so treat NO_CONN as our
+                # disconnect signal and let the network loop reconnect
+                result = self._publish_with_alias(topic, payload, qos)
+                if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                    self.last_message_time = datetime.now()
+                else:
+                    if result.rc == mqtt.MQTT_ERR_NO_CONN:
+                        self.connected = False
+                    self.logger.error("Background publish to %s failed: %s", topic, result.rc)
+            except Exception as e:
+                self.logger.error("Error in publisher thread: %s", e)
+
+        self.logger.debug("Publisher thread stopped")
+
+    def _publish_with_alias(self, topic: str, payload, qos: int = 0):
+        """Publish, substituting an MQTT v5 topic alias when possible
+
+        The first publish to a topic registers the alias (full topic +
+        alias property); subsequent ones send an empty topic with just
+        the 2-byte alias, trimming the per-publish header. Only used
+        from the publisher thread, so the alias table needs no lock;
+        _on_connect bumps _alias_generation on the network thread so an
+        entry from a previous session is never replayed on a new
+        connection (an alias the broker no longer knows is a protocol
+        error that would drop the connection).
+        """
+        gen = self._alias_generation
+        entry = self._topic_aliases.get(topic)
+        if entry is not None and entry[2] != gen:
+            entry = None  # Survivor from a previous connection
+
+        if entry is None:
+            if len(self._topic_aliases) >= self._broker_alias_max:
+                # Broker doesn't allow (more) aliases - plain publish
+                return self.client.publish(topic, payload, qos)
+            entry = [len(self._topic_aliases) + 1, False, gen]
+            self._topic_aliases[topic] = entry
+
+        if entry[1]:
+            if gen != self._alias_generation:
+                # Connection turned over mid-call: full-topic fallback
+                return self.client.publish(topic, payload, qos)
+            props = Properties(PacketTypes.PUBLISH)
+            props.TopicAlias = entry[0]
+            return self.client.publish("", payload, qos, properties=props)
+
+        props = Properties(PacketTypes.PUBLISH)
+        props.TopicAlias = entry[0]
+        result = self.client.publish(topic, payload, qos, properties=props)
+        if result.rc == mqtt.MQTT_ERR_SUCCESS and gen == self._alias_generation:
+            entry[1] = True  # Alias registered with the broker
+        return result
+
+    def _wait_for_ack(self, result, timeout: float = 5.0) -> bool:
+        """Wait for a publish to be acknowledged by the broker
+
+        Blocks on an Event set from _on_publish instead of paho's
+        wait_for_publish(), which spins in a sleep/poll loop. Use only
+        when a caller genuinely needs delivery confirmation.
+        """
+        if result.is_published():
+            return True
+
+        event = threading.Event()
+        with self._pending_lock:
+            self._pending_publishes[result.mid] = event
+
+        try:
+            # Re-check after registering: the ack may have raced us in
+            if result.is_published():
+                return True
+            return event.wait(timeout)
+        finally:
+            with self._pending_lock:
+                self._pending_publishes.pop(result.mid, None)
+
     def _on_publish(self, client, userdata, mid):
         """Callback for successful publish"""
-        self.logger.debug(f"Message {mid} published successfully")
+        # Fires once per outgoing packet - keep formatting lazy
+        self.logger.debug("Message %s published successfully", mid)
+        with self._pending_lock:
+            event = self._pending_publishes.pop(mid, None)
+        if event:
+            event.set()
     
     def _on_message(self, client, userdata, message):
         """Callback for incoming messages"""
         try:
-            payload = message.payload.decode("utf-8")
-            self.logger.info(f"Received message on {message.topic}: {payload}")
-            
-            # Handle device restart command (510)
-            if payload.startswith("510"):
-                self.logger.info("Received restart command from Cumulocity")
-                self._handle_restart_command()
-                
+            payload = message.payload
+
+            # Only decode the payload when the log line will actually be
+            # emitted; dispatch below works on the raw bytes
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Received message on %s: %s", message.topic,
+                                 payload.decode("utf-8", "replace"))
+
+            # Dispatch on the SmartREST message ID (the field before the
+            # first comma) via the handler table
+            handler = self._command_handlers.get(payload.split(b',', 1)[0])
+            if handler:
+                handler()
+
+
         except Exception as e:
-            self.logger.error(f"Error processing incoming message: {e}")
+            self.logger.error("Error processing incoming message: %s", e)
     
     def _handle_restart_command(self):
         """Handle device restart command from Cumulocity"""
         try:
-            # Send restart executing status (501)
-            self.client.publish("s/us", "501,c8y_Restart", qos=2)
+            # Send restart executing status (501). QoS 1 suffices for the
+            # operation status rows: they are idempotent on the platform
+            # side and QoS 2 doubles the ack round trips
+            self.client.publish("s/us", self._restart_ack, qos=1)
             self.logger.info("Restart command acknowledged")
-            
-            # Simulate restart delay
-            import time
-            time.sleep(1)
-            
-            # Send restart completed status (503) 
-            self.client.publish("s/us", "503,c8y_Restart", qos=2)
+
+            # This handler runs on paho's network thread - sleeping here
+            # would stall all MQTT traffic for the simulated restart
+            # delay. Schedule the completion status on a timer instead.
+            threading.Timer(1.0, self._complete_restart).start()
+
+        except Exception as e:
+            self.logger.error("Error handling restart command: %s", e)
+
+    def _complete_restart(self):
+        """Send the restart completed status after the simulated delay"""
+        try:
+            # Send restart completed status (503)
+            self.client.publish("s/us", self._restart_done, qos=1)
             self.logger.info("Restart command completed")
-            
         except Exception as e:
-            self.logger.error(f"Error handling restart command: {e}")
+            self.logger.error("Error completing restart command: %s", e)
     
     def _on_log(self, client, userdata, level, buf):
         """Callback for MQTT logging"""
-        self.logger.debug(f"MQTT Log: {buf}")
-    
-    def _start_reconnect(self):
-        """Start the reconnection process in a background thread"""
-        import threading
-        if self._reconnect_thread is None or not self._reconnect_thread.is_alive():
-            self._reconnect_thread = threading.Thread(target=self._reconnect_loop, daemon=True)
-            self._reconnect_thread.start()
-    
-    def _reconnect_loop(self):
-        """Background reconnection loop with exponential backoff"""
-        while (not self.connected and 
-               self.auto_reconnect and 
-               self.reconnect_attempts < self.max_reconnect_attempts):
-            
-            self.reconnect_attempts += 1
-            
-            # Calculate delay with exponential backoff
-            delay = min(self.reconnect_delay * (2 ** (self.reconnect_attempts - 1)), 
-                       self.max_reconnect_delay)
-            
-            self.logger.info(f"Reconnection attempt {self.reconnect_attempts}/{self.max_reconnect_attempts} "
-                           f"in {delay} seconds...")
-            
-            time.sleep(delay)
-            
-            try:
-                # Attempt to reconnect
-                if self._attempt_reconnection():
-                    self.logger.info("✓ Successfully reconnected to MQTT broker")
-                    self.reconnect_attempts = 0  # Reset counter on success
-                    self.reconnect_delay = 5  # Reset delay
-                    break
-                else:
-                    self.logger.warning(f"Reconnection attempt {self.reconnect_attempts} failed")
-                    
-            except Exception as e:
-                self.logger.error(f"Error during reconnection attempt {self.reconnect_attempts}: {e}")
-        
-        if self.reconnect_attempts >= self.max_reconnect_attempts:
-            self.logger.error("Maximum reconnection attempts reached. Giving up.")
-            self.auto_reconnect = False
-    
-    def _attempt_reconnection(self) -> bool:
-        """Attempt to reconnect to the MQTT broker"""
-        try:
-            # Clean up old client
-            if self.client:
-                try:
-                    self.client.loop_stop()
-                    self.client.disconnect()
-                except:
-                    pass  # Ignore errors during cleanup
-            
-            # Create new client and connect
-            return self.connect()
-            
-        except Exception as e:
-            self.logger.error(f"Error in reconnection attempt: {e}")
-            return False
+        # paho invokes this for every packet in both directions
+        self.logger.debug("MQTT Log: %s", buf)
     
     def enable_auto_reconnect(self, enable: bool = True):
         """Enable or disable automatic reconnection"""
@@ -553,7 +1018,6 @@ class CumulocityMqttClient:
     
     def _start_heartbeat(self):
         """Start heartbeat monitoring in background thread"""
-        import threading
         if self._heartbeat_thread is None or not self._heartbeat_thread.is_alive():
             self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
             self._heartbeat_thread.start()
@@ -562,8 +1026,12 @@ class CumulocityMqttClient:
         """Send periodic heartbeat to monitor connection health"""
         while self.connected and self.auto_reconnect:
             try:
-                time.sleep(self.heartbeat_interval)
-                
+                # Event wait instead of time.sleep so disconnect() wakes
+                # the thread immediately rather than up to a full
+                # interval later
+                if self._stop_event.wait(timeout=self.heartbeat_interval):
+                    break
+
                 if self.connected:
                     # Send a simple ping/heartbeat
                     current_time = datetime.now()
@@ -573,17 +1041,17 @@ class CumulocityMqttClient:
                         (current_time - self.last_message_time).total_seconds() > self.heartbeat_interval):
                         
                         # Send a simple operation to test connection
-                        test_result = self.client.publish("s/us", "400,Connection heartbeat", qos=0)
+                        test_result = self.client.publish("s/us", self._heartbeat_msg, qos=0)
                         
                         if test_result.rc == mqtt.MQTT_ERR_SUCCESS:
                             self.last_heartbeat = current_time
-                            self.logger.debug(f"Heartbeat sent successfully")
+                            self.logger.debug("Heartbeat sent successfully")
                         else:
-                            self.logger.warning(f"Heartbeat failed: {test_result.rc}")
+                            self.logger.warning("Heartbeat failed: %s", test_result.rc)
                             # Connection might be broken, let disconnect callback handle it
                             
             except Exception as e:
-                self.logger.error(f"Error in heartbeat loop: {e}")
+                self.logger.error("Error in heartbeat loop: %s", e)
                 break
         
         self.logger.debug("Heartbeat monitoring stopped")
@@ -605,6 +1073,149 @@ class CumulocityMqttClient:
             'device_id': self.device_id
         }
 
+class SharedBrokerConnection:
+    """Single shared MQTT connection multiplexing many simulated devices
+
+    Instead of one TCP+TLS connection and network loop thread per
+    device, devices sharing the same broker parameters can publish
+    through one paho client. Each device is registered as a Cumulocity
+    child device of the shared gateway client and addressed via the
+    SmartREST s/us/<device_id> topic suffix.
+
+    Use SharedBrokerConnection.acquire() to obtain the connection for a
+    given set of connection parameters and release() when the device
+    shuts down; the underlying client disconnects when the last user
+    releases it.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def acquire(cls, connection_params: Dict[str, Any],
+                client_id: str = None) -> 'SharedBrokerConnection':
+        """Get (or create) the shared connection for these parameters"""
+        # Each device worker is its own process, so the gateway client
+        # ID must be unique per process — a fixed ID would make the
+        # workers' gateway connections take over each other's broker
+        # session in an endless reconnect fight
+        if client_id is None:
+            client_id = f'iot_sim_gateway_{os.getpid()}'
+
+        key = (connection_params.get('broker_host'),
+               connection_params.get('broker_port'),
+               client_id)
+
+        with cls._instances_lock:
+            connection = cls._instances.get(key)
+            if connection is None:
+                connection = cls(connection_params, client_id)
+                cls._instances[key] = connection
+            connection._refcount += 1
+
+        return connection
+
+    def __init__(self, connection_params: Dict[str, Any], client_id: str):
+        self._key = (connection_params.get('broker_host'),
+                     connection_params.get('broker_port'),
+                     client_id)
+        self._refcount = 0
+        self._lock = threading.Lock()
+        self._registered_children = set()
+        self.logger = logging.getLogger(f'MQTT-shared-{client_id}')
+
+        # The gateway itself is a regular Cumulocity MQTT client; all
+        # connection/reconnect/heartbeat handling is reused from it
+        self.gateway = CumulocityMqttClient(
+            broker_host=connection_params.get('broker_host'),
+            broker_port=connection_params.get('broker_port', 1883),
+            username=connection_params.get('username'),
+            password=connection_params.get('password'),
+            tenant=connection_params.get('tenant'),
+            device_id=client_id,
+            client_id=client_id,
+            use_ssl=connection_params.get('use_ssl', False),
+            ca_cert_path=connection_params.get('ca_cert_path'),
+            client_cert_path=connection_params.get('client_cert_path'),
+            client_key_path=connection_params.get('client_key_path'),
+            transport=connection_params.get('transport', 'tcp')
+        )
+
+    @property
+    def connected(self) -> bool:
+        return self.gateway.connected
+
+    def connect(self) -> bool:
+        """Connect the shared client; idempotent across devices"""
+        with self._lock:
+            if self.gateway.connected:
+                return True
+            if not self.gateway.connect():
+                return False
+            # Register the gateway device itself once
+            return self.gateway.register_device('c8y_MQTTDevice', self._key[2])
+
+    def register_child_device(self, device_id: str, device_name: str) -> bool:
+        """Register a device as a child of the shared gateway"""
+        with self._lock:
+            if device_id in self._registered_children:
+                return True
+
+            # SmartREST 101: create child device under the connection's device
+            result = self.gateway.client.publish(
+                "s/us", f"101,{device_id},{device_name},c8y_MQTTDevice".encode(), qos=1)
+
+            if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                self._registered_children.add(device_id)
+                self.logger.info("Registered child device '%s' as '%s'", device_id, device_name)
+                return True
+
+            self.logger.error("Failed to register child device '%s': %s", device_id, result.rc)
+            return False
+
+    def send_measurement_for_device(self, device_id: str,
+                                    measurement_data: Dict[str, Any]) -> bool:
+        """Publish one device's measurement via the shared connection"""
+        try:
+            if not self.gateway.connected:
+                self.logger.warning("Shared MQTT connection not connected")
+                return False
+
+            timestamp = measurement_data.get('timestamp') or _iso_now()
+
+            # One multi-row SmartREST publish addressed to the child device
+            rows = [
+                f"200,c8y_ElectricMeasurement,voltage,{measurement_data['voltage']},V,{timestamp}",
+                f"200,c8y_ElectricMeasurement,current,{measurement_data['current']},A,{timestamp}",
+                f"200,c8y_ElectricMeasurement,power,{measurement_data['power']},W,{timestamp}",
+            ]
+            if 'kwh' in measurement_data:
+                rows.append(f"200,c8y_ElectricMeasurement,energy,{measurement_data['kwh']},kWh,{timestamp}")
+
+            result = self.gateway.client.publish(f"s/us/{device_id}",
+                                                 "\n".join(rows).encode(), qos=0)
+
+            if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                self.gateway.last_message_time = datetime.now()
+                return True
+
+            self.logger.error("Failed to publish measurement for %s: %s", device_id, result.rc)
+            return False
+
+        except Exception as e:
+            self.logger.error("Error sending measurement for %s: %s", device_id, e)
+            return False
+
+    def release(self):
+        """Release one device's hold on the shared connection"""
+        with self._instances_lock:
+            self._refcount -= 1
+            if self._refcount <= 0:
+                self._instances.pop(self._key, None)
+                self.gateway.disconnect()
+                self.logger.info("Shared MQTT connection closed (no more users)")
+
+
 class MqttSettings:
     """Manages MQTT connection settings"""
     
@@ -623,30 +1234,68 @@ class MqttSettings:
             'client_cert_path': '',
             'client_key_path': '',
             'bootstrap_user': '',
-            'bootstrap_password': ''
+            'bootstrap_password': '',
+            'max_inflight_messages': 20,
+            'max_queued_messages': 1000,
+            'share_broker_connection': False,
+            'transport': 'tcp'
         }
+        self._last_saved = None  # Serialized form of the last write, to skip no-op saves
+        self._connection_params = None  # Memoized get_connection_params() result
+        self._settings_mtime = None  # mtime of the file backing self.settings
         self.settings = self.load_settings()
-    
+
     def load_settings(self) -> Dict[str, Any]:
         """Load MQTT settings from JSON file"""
-        import os
-        if os.path.exists(self.settings_file):
-            try:
-                with open(self.settings_file, 'r') as f:
-                    loaded_settings = json.load(f)
-                    settings = self.default_settings.copy()
-                    settings.update(loaded_settings)
-                    return settings
-            except Exception as e:
-                print(f"Error loading MQTT settings: {e}")
-        
+        try:
+            mtime = os.path.getmtime(self.settings_file)
+        except OSError:
+            return self.default_settings.copy()
+
+        # Skip the re-read and re-parse when the file hasn't changed
+        # since the last load
+        if mtime == self._settings_mtime and self.settings is not None:
+            return self.settings
+
+        try:
+            with open(self.settings_file, 'rb') as f:
+                loaded_settings = _json_loads(f.read())
+                settings = self.default_settings.copy()
+                settings.update(loaded_settings)
+                # Keep the in-memory copy in sync so the mtime guard
+                # above returns fresh data on the next call
+                self.settings = settings
+                self._connection_params = None
+                self._settings_mtime = mtime
+                return settings
+        except Exception as e:
+            print(f"Error loading MQTT settings: {e}")
+
         return self.default_settings.copy()
     
     def save_settings(self):
         """Save MQTT settings to JSON file"""
         try:
-            with open(self.settings_file, 'w') as f:
-                json.dump(self.settings, f, indent=2)
+            # Settings are saved on every update_settings() call, often
+            # with unchanged values; comparing the serialized form first
+            # avoids rewriting an identical file
+            payload = _json_dumps(self.settings)
+            if payload == self._last_saved:
+                return
+
+            # Same tmp-and-replace scheme as the registration status
+            # file, so a reader never observes a half-written settings file
+            tmp_file = f"{self.settings_file}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_file, self.settings_file)
+            self._last_saved = payload
+            # self.settings already reflects the write, so mark the new
+            # mtime as seen to keep load_settings from re-parsing it
+            try:
+                self._settings_mtime = os.path.getmtime(self.settings_file)
+            except OSError:
+                self._settings_mtime = None
         except Exception as e:
             print(f"Error saving MQTT settings: {e}")
     
@@ -655,15 +1304,27 @@ class MqttSettings:
         for key, value in kwargs.items():
             if key in self.default_settings:
                 self.settings[key] = value
+        self._connection_params = None  # Rebuilt on next access
         self.save_settings()
     
     def is_enabled(self) -> bool:
         """Check if MQTT is enabled"""
         return self.settings.get('enabled', False)
+
+    def use_shared_connection(self) -> bool:
+        """Check if devices should share one broker connection"""
+        return self.settings.get('share_broker_connection', False)
     
     def get_connection_params(self) -> Dict[str, Any]:
-        """Get connection parameters for MQTT client"""
-        return {
+        """Get connection parameters for MQTT client
+
+        The derived dict is memoized - it is requested by every device
+        worker and status endpoint but only changes via update_settings().
+        """
+        if self._connection_params is not None:
+            return self._connection_params
+
+        self._connection_params = {
             'broker_host': self.settings.get('broker_host', ''),
             'broker_port': 8883 if self.settings.get('use_ssl', False) else self.settings.get('broker_port', 1883),
             'username': self.settings.get('username', ''),
@@ -672,8 +1333,24 @@ class MqttSettings:
             'use_ssl': self.settings.get('use_ssl', False),
             'ca_cert_path': self.settings.get('ca_cert_path', ''),
             'client_cert_path': self.settings.get('client_cert_path', ''),
-            'client_key_path': self.settings.get('client_key_path', '')
+            'client_key_path': self.settings.get('client_key_path', ''),
+            'max_inflight_messages': self.settings.get('max_inflight_messages', 20),
+            'max_queued_messages': self.settings.get('max_queued_messages', 1000),
+            'transport': self.settings.get('transport', 'tcp')
         }
+        return self._connection_params
+
+# Global MQTT settings instance, constructed lazily on first access so
+# that merely importing this module (e.g. in forked device workers that
+# never touch MQTT) does not trigger settings-file I/O
+_mqtt_settings = None
+
 
-# Global MQTT settings instance
-mqtt_settings = MqttSettings()
\ No newline at end of file
+def __getattr__(name):
+    """Module-level lazy attribute hook for the settings singleton"""
+    global _mqtt_settings
+    if name == 'mqtt_settings':
+        if _mqtt_settings is None:
+            _mqtt_settings = MqttSettings()
+        return _mqtt_settings
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file